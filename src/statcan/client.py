@@ -1,3 +1,5 @@
+import concurrent.futures
+import contextlib
 import csv
 import dataclasses
 import pathlib
@@ -7,11 +9,15 @@ from functools import cached_property
 
 import logging
 import enum
+import importlib.util
 import io
+import operator
+import queue
+import tempfile
+import threading
 import zipfile
 from pathlib import Path
 import httpx
-import re
 
 _has_polars = False
 _has_pandas = False
@@ -23,11 +29,15 @@ except ImportError:
     pass
 
 try:
+    import numpy as np
     import pandas as pd
     _has_pandas = True
 except ImportError:
     pass
 
+# Tables are parsed with pyarrow's multithreaded csv reader when it is installed.
+_has_pyarrow = importlib.util.find_spec("pyarrow") is not None
+
 
 def _assert_has_polars():
     if not _has_polars:
@@ -38,8 +48,183 @@ def _assert_has_pandas():
         raise ImportError("pandas is required but not found. Please install the 'pandas' extra with 'pip install statcan[pandas]'")
 
 
+def _constant_categorical(value: str, length: int):
+    """Build a single-category pandas Categorical that repeats `value` `length` times.
+
+    Stores one byte per row instead of a Python object pointer per row.
+    :param value:
+    :param length:
+    :return:
+    """
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[value])
+
+
+def _read_csv_pandas(table: bytes, string_columns: typing.Sequence[str]):
+    """Parse csv contents into a pandas Dataframe, reading `string_columns` as strings.
+
+    pandas' own pyarrow engine only applies `dtype` after the columns were parsed, which
+    turns a coordinate like "1.10" into the float 1.1 first, so the arrow reader is driven
+    directly and given the column types up front.
+    :param table:
+    :param string_columns: Columns to keep as written. Columns missing from the table are ignored.
+    :return:
+    """
+    if not _has_pyarrow:
+        return pd.read_csv(io.BytesIO(table), dtype={column: str for column in string_columns})
+
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    convert_options = pa_csv.ConvertOptions(
+        column_types={column: pa.string() for column in string_columns},
+        strings_can_be_null=True,
+    )
+    return pa_csv.read_csv(pa.BufferReader(table), convert_options=convert_options).to_pandas()
+
+
 logger = logging.getLogger(__name__)
 
+# Size of the chunks streamed from the network and out of the zip archive.
+_CHUNK_SIZE = 1 << 16
+# Archives up to this size are received into pooled buffers, larger ones are spilled to a temporary file.
+_POOLED_BUFFER_MAX_SIZE = 1 << 26
+# At most this many idle archive buffers are kept for reuse.
+_BUFFER_POOL_SIZE = 2
+# Default cap on how many tables StatCan.download_many fetches at once.
+_DOWNLOAD_MAX_WORKERS = 8
+
+_buffers = threading.local()
+_buffer_pool = queue.LifoQueue(maxsize=_BUFFER_POOL_SIZE)
+
+
+def _chunk_buffer() -> memoryview:
+    """Get this thread's reusable chunk buffer, allocating it on first use.
+
+    :return:
+    """
+    buffer = getattr(_buffers, "chunk", None)
+    if buffer is None:
+        buffer = _buffers.chunk = memoryview(bytearray(_CHUNK_SIZE))
+    return buffer
+
+
+def _copy_stream(source: typing.BinaryIO, destination: typing.BinaryIO):
+    """Copy a binary stream into another one chunk by chunk through the thread's reusable buffer.
+
+    :param source:
+    :param destination:
+    :return:
+    """
+    buffer = _chunk_buffer()
+    while True:
+        size = source.readinto(buffer)
+        if not size:
+            break
+        destination.write(buffer[:size])
+
+
+@contextlib.contextmanager
+def _rent_buffer() -> typing.Iterator[bytearray]:
+    """Borrow a bytearray from the shared pool, allocating one if the pool is empty.
+
+    The buffer is handed back to the pool afterwards, or dropped if the pool is already full.
+    :return:
+    """
+    try:
+        buffer = _buffer_pool.get_nowait()
+    except queue.Empty:
+        buffer = bytearray()
+    try:
+        yield buffer
+    finally:
+        try:
+            _buffer_pool.put_nowait(buffer)
+        except queue.Full:
+            pass
+
+
+class _BufferReader(io.RawIOBase):
+    """A read-only, seekable file over a memoryview, so zipfile can read a pooled buffer without copying it."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        size = max(0, min(len(b), len(self._view) - self._position))
+        b[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = len(self._view) + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def _receive_archive(response: httpx.Response, stack: contextlib.ExitStack) -> typing.BinaryIO:
+    """Receive the response body into a pooled buffer, or into a temporary file once it outgrows the pool.
+
+    Everything acquired here is released when `stack` is closed.
+    :param response:
+    :param stack:
+    :return: A seekable file over the received archive.
+    """
+    spill = None
+    content_length = response.headers.get("Content-Length")
+    if content_length is not None and int(content_length) > _POOLED_BUFFER_MAX_SIZE:
+        spill = stack.enter_context(tempfile.TemporaryFile())
+    else:
+        buffer = stack.enter_context(_rent_buffer())
+        size = 0
+
+    for chunk in response.iter_bytes(_CHUNK_SIZE):
+        if spill is None and size + len(chunk) > _POOLED_BUFFER_MAX_SIZE:
+            spill = stack.enter_context(tempfile.TemporaryFile())
+            with memoryview(buffer) as view, view[:size] as received:
+                spill.write(received)
+        if spill is not None:
+            spill.write(chunk)
+            continue
+        # Overwrite the borrowed buffer in place; it only grows when this archive is
+        # larger than any it held before.
+        buffer[size:size + len(chunk)] = chunk
+        size += len(chunk)
+
+    if spill is not None:
+        spill.seek(0)
+        return spill
+    view = stack.enter_context(memoryview(buffer))
+    return _BufferReader(stack.enter_context(view[:size]))
+
+
+def _read_member(archive: zipfile.ZipFile, name: str) -> bytes:
+    """Decompress a single member of the archive incrementally.
+
+    :param archive:
+    :param name:
+    :return:
+    """
+    bio = io.BytesIO()
+    with archive.open(name) as member:
+        _copy_stream(member, bio)
+    return bio.getvalue()
+
 
 class Language(enum.Enum):
     ENGLISH = "en"
@@ -49,10 +234,13 @@ class Language(enum.Enum):
         return self.value
 
     def url_for(self, table_number: str) -> str:
-        if self == Language.ENGLISH:
-            return f"https://www150.statcan.gc.ca/n1/{self}/tbl/csv/{table_number}-eng.zip"
-        else:
-            return f"https://www150.statcan.gc.ca/n1/{self}/tbl/csv/{table_number}-{self}.zip"
+        return _URL_TEMPLATES[self].format(table_number)
+
+
+_URL_TEMPLATES = {
+    Language.ENGLISH: "https://www150.statcan.gc.ca/n1/en/tbl/csv/{}-eng.zip",
+    Language.FRENCH: "https://www150.statcan.gc.ca/n1/fr/tbl/csv/{}-fr.zip",
+}
 
 
 @dataclasses.dataclass
@@ -69,101 +257,136 @@ class CSVContents:
 
         :return:
         """
-        lines = iter(self.metadata.split(b"\n", maxsplit=2))
-        next(lines)
-        second = next(lines).decode("utf-8")
+        # Only the second line is needed, so avoid splitting the rest of the metadata.
+        start = self.metadata.find(b"\n") + 1
+        end = self.metadata.find(b"\n", start)
+        if end == -1:
+            end = len(self.metadata)
+        second = self.metadata[start:end].decode("utf-8")
         reader = csv.reader([second])
         return next(reader)[0]
 
+    def _peek_table(self) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        """Parse just the header and the first row of the table without loading the rest.
+
+        :return:
+        """
+        first = self.table.find(b"\n") + 1
+        second = self.table.find(b"\n", first)
+        if second == -1:
+            second = len(self.table)
+        lines = self.table[:second].decode("utf-8-sig").splitlines()
+        header, row = csv.reader(lines)
+        return header, row
+
 
     def get_df_polars(self):
         """Load the wrangled CSV contents as a Polars Dataframe.
 
+        The dataframe is built on the first call and the same one is returned afterwards.
         :return:
         """
+        return self._df_polars
 
+    @cached_property
+    def _df_polars(self):
         _assert_has_polars()
 
-        df = pl.read_csv(source=self.table, has_header=True)
+        # Scan lazily so the parse and the column rewrites below run as one multithreaded query.
+        # The shape of the table is peeked at from the raw bytes, since probing the
+        # lazy frame for it would parse the csv a second time.
+        lf = pl.scan_csv(
+            self.table,
+            has_header=True,
+            schema_overrides={"REF_DATE": pl.String, "COORDINATE": pl.String},
+        )
         dataset_name = self.dataset_name
+        _, first_row = self._peek_table()
 
         columns = [
-            pl.lit(dataset_name).alias("INDICATOR"),
+            pl.lit(dataset_name).cast(pl.Categorical).alias("INDICATOR"),
         ]
-        if "COORDINATE" in df.columns:
-            columns.append(
-                (pl.col("COORDINATE").cast(pl.String)).alias("COORDINATE")
-            )
 
-        ref_date = str(df[0, 0])
+        ref_date = first_row[0]
         if len(ref_date) == 4:
+            # 2021
             columns.append(
-                (pl.format("{}-1-1", 'REF_DATE').cast(pl.Date)).alias("REF_DATE")
+                pl.col("REF_DATE").str.to_date(format="%Y").alias("REF_DATE")
             )
         elif len(ref_date) == 7:
+            # 2021-01
             columns.append(
-                (pl.format("{}-1", 'REF_DATE').cast(pl.Date)).alias("REF_DATE")
+                pl.col("REF_DATE").str.to_date(format="%Y-%m").alias("REF_DATE")
             )
         elif len(ref_date) == 9:
+            # 2020/2021
             columns.append(
-                ((pl.col("REF_DATE").str.replace(r".*/(\d{4})", "${1}-3-31")).cast(pl.Date)).alias("REF_DATE")
+                pl.date(pl.col("REF_DATE").str.extract(r"/(\d{4})").cast(pl.Int32), 3, 31).alias("REF_DATE")
             )
             columns.append(
-                pl.lit("Fiscal Year").alias("REF_PERIOD")
+                pl.lit("Fiscal Year").cast(pl.Categorical).alias("REF_PERIOD")
             )
 
-        return df.with_columns(*columns)
+        return lf.with_columns(*columns).collect()
 
     def get_df_pandas(self):
         """Load the wrangled CSV contents as a Pandas Dataframe.
 
+        The dataframe is built on the first call and the same one is returned afterwards.
         :return:
         """
+        return self._df_pandas
+
+    @cached_property
+    def _df_pandas(self):
         _assert_has_pandas()
-        df = pd.read_csv(io.BytesIO(self.table))
+        df = _read_csv_pandas(self.table, string_columns=("COORDINATE", ))
 
-        df["INDICATOR"] = self.dataset_name
-        if "COORDINATE" in df.columns:
-            df["COORDINATE"] = df["COORDINATE"].astype(str)
+        df["INDICATOR"] = _constant_categorical(self.dataset_name, len(df))
 
         ref_date = str(df.iloc[0, 0])
         if len(ref_date) == 4:
             # 2021
-            df["REF_DATE"] = df["REF_DATE"].apply(lambda s: f'{s}-1-1')
-            df["REF_DATE"] = pd.to_datetime(df["REF_DATE"])
+            df["REF_DATE"] = pd.to_datetime(df["REF_DATE"].astype(str), format="%Y")
         elif len(ref_date) == 7:
             # 2021-01
-            df["REF_DATE"] = df["REF_DATE"].apply(lambda s: f'{s}-1')
-            df["REF_DATE"] = pd.to_datetime(df["REF_DATE"])
+            df["REF_DATE"] = pd.to_datetime(df["REF_DATE"], format="%Y-%m")
         elif len(ref_date) == 9:
-            df["REF_DATE"] = df["REF_DATE"].str.replace(r".*/", "", regex=True)
-            df["REF_DATE"] = df["REF_DATE"].apply(lambda s: f'{s}-3-31')
-            df["REF_PERIOD"] = "Fiscal year"
-            df["REF_DATE"] = pd.to_datetime(df["REF_DATE"])
+            # 2020/2021
+            df["REF_DATE"] = pd.to_datetime(df["REF_DATE"].str.split("/").str[1] + "-03-31", format="%Y-%m-%d")
+            df["REF_PERIOD"] = _constant_categorical("Fiscal year", len(df))
         else:
-            df["REF_DATE"] = df["REF_DATE"].apply(lambda s: f'{s}')
-            df["REF_DATE"] = pd.to_datetime(df["REF_DATE"])
+            df["REF_DATE"] = pd.to_datetime(df["REF_DATE"].astype(str))
         return df
 
-    def get_prepared_csv(self) -> bytes:
-        bio = io.BytesIO()
+    def get_prepared_csv(self, path_or_buf=None) -> typing.Optional[bytes]:
+        """Serialize the wrangled CSV contents with whichever backend is available.
+
+        :param path_or_buf: A path or binary file-like object to write the csv to. If not given,
+                            the csv is returned as bytes instead.
+        :return:
+        """
+        bio = io.BytesIO() if path_or_buf is None else path_or_buf
         if _has_pandas:
             df = self.get_df_pandas()
             df.to_csv(bio, index=False)  # noqa
-            return bio.getvalue()
-        if _has_polars:
+        elif _has_polars:
             df = self.get_df_polars()
             df.write_csv(bio)
+        else:
+            raise RuntimeError(
+                "Neither polars nor pandas backends are available to wrangle the csv. "
+                "Please install one with 'pip install statcan[polars]' or 'pip install statcan[pandas]'"
+            )
+        if path_or_buf is None:
             return bio.getvalue()
-        raise RuntimeError(
-            "Neither polars nor pandas backends are available to wrangle the csv. "
-            "Please install one with 'pip install statcan[polars]' or 'pip install statcan[pandas]'"
-        )
+        return None
 
 
 def _setup_http_client():
     try:
         import hishel
+        from statcan.cache import BinarySerializer
 
         controller = hishel.Controller(
             cacheable_methods=["GET"],
@@ -172,7 +395,8 @@ def _setup_http_client():
             always_revalidate=True,
         )
         storage = hishel.FileStorage(
-            base_path=Path(".cache")
+            base_path=Path(".cache"),
+            serializer=BinarySerializer(),
         )
         logger.debug("hishel client initialized. Responses may be cached.")
         return hishel.CacheClient(controller=controller, storage=storage)
@@ -192,21 +416,21 @@ class StatCan:
                  save_dir: typing.Optional[pathlib.Path] = None,
                  ) -> CSVContents:
         table_number = table_number[:-2].replace("-", "")
-        response = self.client.get(
+        with self.client.stream(
+            "GET",
             language.url_for(table_number),
             timeout=httpx.Timeout(300, pool=None, connect=None),
-        )
-        response.raise_for_status()
-        zipped_contents = io.BytesIO(response.content)
-        with zipfile.ZipFile(
-            zipped_contents,
-            "r",
-            zipfile.ZIP_DEFLATED,
-            False
-        ) as zipped_contents:
-            contents = zipped_contents.read(f"{table_number}.csv")
-            metadata = zipped_contents.read(f"{table_number}_MetaData.csv")
-            csv_contents = CSVContents(table=contents, metadata=metadata)
+        ) as response, contextlib.ExitStack() as stack:
+            response.raise_for_status()
+            with zipfile.ZipFile(
+                _receive_archive(response, stack),
+                "r",
+                zipfile.ZIP_DEFLATED,
+                False
+            ) as zipped_contents:
+                contents = _read_member(zipped_contents, f"{table_number}.csv")
+                metadata = _read_member(zipped_contents, f"{table_number}_MetaData.csv")
+                csv_contents = CSVContents(table=contents, metadata=metadata)
 
         if save_dir:
             if not save_dir.is_dir():
@@ -214,16 +438,40 @@ class StatCan:
                 return csv_contents
             save_path = save_dir / f"statcan_{table_number}_{language}.csv"
             logger.info(f"Saving to {save_path}")
-            with open(str(save_path), "w") as f:
-                f.write(csv_contents.get_prepared_csv().decode("utf-8"))
+            with open(str(save_path), "wb") as f:
+                csv_contents.get_prepared_csv(f)
 
         return csv_contents
 
+    def download_many(self,
+                      tables: typing.Iterable[typing.Tuple[str, Language]],
+                      save_dir: typing.Optional[pathlib.Path] = None,
+                      max_workers: typing.Optional[int] = None,
+                      ) -> typing.List[CSVContents]:
+        """Download several tables concurrently, sharing the client's connection pool.
+
+        Each table is downloaded (and saved, if `save_dir` is given) on its own worker thread,
+        so the network transfer of one table overlaps with the unzipping and wrangling of another.
+        :param tables: Pairs of hyphenated table number and language.
+        :param save_dir:
+        :param max_workers: The most tables downloaded at once. Defaults to one worker per table,
+                            up to `_DOWNLOAD_MAX_WORKERS` (8), since each in-flight table holds
+                            its whole archive and decompressed contents in memory.
+        :return: The contents of each table, in the same order as `tables`.
+        """
+        tables = list(tables)
+        if not tables:
+            return []
+        max_workers = max_workers or min(len(tables), _DOWNLOAD_MAX_WORKERS)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self.download, table_number, language, save_dir)
+                for table_number, language in tables
+            ]
+            return [future.result() for future in futures]
+
 
-def match(expr, item):
-    if item is None:
-        return False
-    return re.search(expr, item) is not None
+_CATALOGUE_COLUMNS = ("title", "id", "description", "release_date", "lang")
 
 
 class MetadataDatabase:
@@ -243,24 +491,31 @@ class MetadataDatabase:
         response.raise_for_status()
         bio = io.BytesIO(response.content)
 
-        if _has_pandas:
-            df = pd.read_csv(bio, usecols=["title", "id", "description", "release_date", "lang"])
-            rows = df.values.tolist()
-        elif _has_polars:
-            df = pl.read_csv(bio)
-            rows = df.rows(named=False)
-        else:
-            raise RuntimeError(
-                "Neither polars nor pandas backends are available to wrangle the csv. "
-                "Please install one with 'pip install statcan[polars]' or 'pip install statcan[pandas]'"
-            )
+        reader = csv.reader(io.TextIOWrapper(bio, encoding="utf-8", newline=""))
+        header = next(reader)
+        columns = operator.itemgetter(*(header.index(column) for column in _CATALOGUE_COLUMNS))
+        # Fed lazily to executemany so the catalogue is never held as a list of rows.
+        # Missing descriptions are stored as NULL rather than as empty strings.
+        rows = (
+            (title, data_id, description or None, release_date, lang)
+            for title, data_id, description, release_date, lang in map(columns, reader)
+        )
 
-        self.connection = sqlite3.connect(self.path)
-        self.connection.create_function("MATCHES", 2, match)
+        # Autocommit mode: reads don't open implicit transactions, writes below are bracketed explicitly.
+        self.connection = sqlite3.connect(self.path, isolation_level=None)
+        # Reused by every search; sqlite3 keeps the prepared statement in the connection's cache.
+        self._cursor = self.connection.cursor()
+        # The database is only a cache of the catalogue that can be rebuilt at any time,
+        # so trade durability for a fast bulk load.
+        self.connection.executescript("""
+        PRAGMA journal_mode=MEMORY;
+        PRAGMA synchronous=OFF;
+        PRAGMA temp_store=MEMORY;
+        """)
 
         _create_table_stmt = """
         CREATE TABLE IF NOT EXISTS statcan (
-            _id INTEGER PRIMARY KEY AUTOINCREMENT,
+            _id INTEGER PRIMARY KEY,
             title TEXT,
             data_id TEXT,
             description TEXT,
@@ -270,34 +525,59 @@ class MetadataDatabase:
         """
         self.connection.execute(_create_table_stmt)
 
+        _create_index_stmt = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS statcan_fts USING fts5(
+            title,
+            description,
+            content='statcan',
+            content_rowid='_id'
+        );
+        """
+        self.connection.execute(_create_index_stmt)
+
         _insert_rows_stmt = """
         INSERT INTO statcan (title, data_id, description, release_date, lang)
         VALUES (?, ?, ?, ?, ?)
         """
 
-        self.connection.executemany(_insert_rows_stmt, rows)
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(_insert_rows_stmt, rows)
+            self.connection.execute("INSERT INTO statcan_fts(statcan_fts) VALUES('rebuild')")
         (rows_inserted, ) = self.connection.execute("SELECT COUNT(*) FROM statcan").fetchone()
         logger.info(f"Inserted ({rows_inserted}) rows into the database.")
 
     def search(self, *args):
-        """Search for the datasets whose titles or descriptions contain the provided keywords exactly.
+        """Search for the datasets whose titles or descriptions contain any of the provided keywords.
 
-        Note: There's a risk oF SQL-injection here but if you do that to yourself
-              I can't say that's not deserved.
+        Keywords are matched case-insensitively against the words of the title and description
+        using the full-text index built by `load`, so "labour" also matches "Labour" and "labourers".
+        Without any (non-empty) keywords, the whole catalogue is returned.
         :param args:
         :return:
         """
-        keywords_or = "(" + "|".join(args) + ")"
-
-        search_stmt = """
-        SELECT title, data_id, description, release_date, lang
-        FROM statcan
-        WHERE MATCHES(?, title) OR MATCHES(?, description);
-        """
-        results = self.connection.execute(search_stmt, (keywords_or, keywords_or)).fetchall()
+        keywords = [keyword for keyword in args if keyword]
+
+        if keywords:
+            keywords_or = " OR ".join('"' + keyword.replace('"', '""') + '"*' for keyword in keywords)
+            search_stmt = """
+            SELECT s.title, s.data_id, s.description, s.release_date, s.lang
+            FROM statcan_fts f
+            JOIN statcan s ON s._id = f.rowid
+            WHERE statcan_fts MATCH ?
+            ORDER BY s._id;
+            """
+            results = self._cursor.execute(search_stmt, (keywords_or, )).fetchall()
+        else:
+            search_stmt = """
+            SELECT title, data_id, description, release_date, lang
+            FROM statcan
+            ORDER BY _id;
+            """
+            results = self._cursor.execute(search_stmt).fetchall()
 
         if _has_pandas:
-            return pd.DataFrame.from_records(results, columns=["title", "id", "description", "release_date", "lang"])
+            return pd.DataFrame.from_records(results, columns=list(_CATALOGUE_COLUMNS))
         if _has_polars:
-            return pl.DataFrame(results, schema=["title", "id", "description", "release_date", "lang"])
+            return pl.DataFrame(results, schema=list(_CATALOGUE_COLUMNS))
         return results
@@ -0,0 +1,51 @@
+import datetime
+
+import pytest
+
+hishel = pytest.importorskip("hishel")
+
+from httpcore import Request, Response  # noqa: E402
+
+from statcan.cache import BinarySerializer  # noqa: E402
+
+
+BODY = b"PK\x03\x04\x00zipped\x00table\x00"
+
+
+def _entry():
+    response = Response(200, headers=[(b"Content-Type", b"application/zip")], content=BODY)
+    response.read()
+    request = Request("GET", "https://www150.statcan.gc.ca/n1/en/tbl/csv/14100287-eng.zip")
+    metadata = {
+        "cache_key": "key",
+        "number_of_uses": 1,
+        "created_at": datetime.datetime(2024, 1, 1),
+    }
+    return response, request, metadata
+
+
+def _assert_loaded(loaded):
+    response, request, metadata = loaded
+    response.read()
+    assert response.status == 200
+    assert response.content == BODY
+    assert response.headers == [(b"Content-Type", b"application/zip")]
+    assert request.url.target == b"/n1/en/tbl/csv/14100287-eng.zip"
+    assert metadata["cache_key"] == "key"
+    assert metadata["number_of_uses"] == 1
+
+
+def test_round_trip_keeps_body_with_separator_bytes():
+    serializer = BinarySerializer()
+
+    data = serializer.dumps(*_entry())
+
+    assert data.endswith(BODY)
+    _assert_loaded(serializer.loads(data))
+
+
+def test_loads_entries_written_by_json_serializer():
+    data = hishel.JSONSerializer().dumps(*_entry())
+
+    _assert_loaded(BinarySerializer().loads(data))
+    _assert_loaded(BinarySerializer().loads(data.encode("utf-8")))
@@ -0,0 +1,133 @@
+import io
+import zipfile
+
+import httpx
+import pytest
+
+from statcan import client
+from statcan.client import CSVContents, Language, StatCan
+
+
+METADATA = b'"Cube Title","Product Id"\n"Labour force characteristics","14100287"\n'
+TABLE = b'"REF_DATE","GEO","COORDINATE","VALUE"\n"2021-01","Canada","1.10",1.5\n"2021-02","Canada","1.20",2.5\n'
+
+
+@pytest.mark.parametrize("has_pyarrow", [True, False])
+def test_pandas_keeps_coordinate_as_written(monkeypatch, has_pyarrow):
+    pytest.importorskip("pandas")
+    if has_pyarrow:
+        pytest.importorskip("pyarrow")
+    monkeypatch.setattr(client, "_has_pyarrow", has_pyarrow)
+
+    df = CSVContents(table=TABLE, metadata=METADATA).get_df_pandas()
+
+    assert df["COORDINATE"].tolist() == ["1.10", "1.20"]
+
+
+def test_polars_keeps_coordinate_as_written():
+    pytest.importorskip("polars")
+
+    df = CSVContents(table=TABLE, metadata=METADATA).get_df_polars()
+
+    assert df["COORDINATE"].to_list() == ["1.10", "1.20"]
+
+
+def _zipped_table(table_number: str) -> bytes:
+    bio = io.BytesIO()
+    with zipfile.ZipFile(bio, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(f"{table_number}.csv", TABLE)
+        archive.writestr(f"{table_number}_MetaData.csv", METADATA)
+    return bio.getvalue()
+
+
+def _statcan(handler) -> StatCan:
+    statcan = StatCan()
+    statcan.client = httpx.Client(transport=httpx.MockTransport(handler))
+    return statcan
+
+
+@pytest.fixture
+def buffer_pool(monkeypatch):
+    pool = client.queue.LifoQueue(maxsize=client._BUFFER_POOL_SIZE)
+    monkeypatch.setattr(client, "_buffer_pool", pool)
+    return pool
+
+
+def test_download_many_keeps_buffer_pool_bounded(buffer_pool):
+    archive = _zipped_table("14100287")
+    statcan = _statcan(lambda request: httpx.Response(200, content=archive))
+
+    results = statcan.download_many([("14-10-0287-01", Language.ENGLISH)] * 6, max_workers=6)
+
+    assert [result.table for result in results] == [TABLE] * 6
+    assert buffer_pool.qsize() <= client._BUFFER_POOL_SIZE
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_download_spills_large_archives_to_disk(monkeypatch, buffer_pool, chunked):
+    archive = _zipped_table("14100287")
+    monkeypatch.setattr(client, "_POOLED_BUFFER_MAX_SIZE", len(archive) // 2)
+    spills = []
+    temporary_file = client.tempfile.TemporaryFile
+    monkeypatch.setattr(client.tempfile, "TemporaryFile", lambda: spills.append(1) or temporary_file())
+
+    def handler(request):
+        if chunked:
+            # No Content-Length, so the spill happens once the buffer passes the cap.
+            return httpx.Response(200, content=iter([archive[:100], archive[100:]]))
+        return httpx.Response(200, content=archive)
+
+    result = _statcan(handler).download("14-10-0287-01", Language.ENGLISH)
+
+    assert result.table == TABLE
+    assert result.metadata == METADATA
+    assert spills == [1]
+    assert all(len(buffer) <= len(archive) // 2 for buffer in buffer_pool.queue)
+
+
+def test_download_many_caps_concurrent_downloads(monkeypatch):
+    archive = _zipped_table("14100287")
+    workers = []
+    executor = client.concurrent.futures.ThreadPoolExecutor
+
+    def spy(max_workers):
+        workers.append(max_workers)
+        return executor(max_workers=max_workers)
+
+    monkeypatch.setattr(client.concurrent.futures, "ThreadPoolExecutor", spy)
+    statcan = _statcan(lambda request: httpx.Response(200, content=archive))
+
+    results = statcan.download_many([("14-10-0287-01", Language.ENGLISH)] * 20)
+
+    assert len(results) == 20
+    assert workers == [client._DOWNLOAD_MAX_WORKERS]
+
+
+CATALOGUE = (
+    b'"","title","id","description","release_date","lang"\n'
+    b'"1","Labour force characteristics","14-10-0287-01","Monthly estimates",2024-01-05,"eng"\n'
+    b'"2","Chartered bank aggregates","10-10-0135-01","",2023-12-11,"eng"\n'
+)
+
+
+@pytest.fixture
+def database():
+    db = client.MetadataDatabase(path=":memory:")
+    db.client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=CATALOGUE)))
+    db.load()
+    return db
+
+
+def _ids(results):
+    if client._has_pandas or client._has_polars:
+        return list(results["id"])
+    return [row[1] for row in results]
+
+
+def test_search_matches_keywords(database):
+    assert _ids(database.search("labour")) == ["14-10-0287-01"]
+
+
+@pytest.mark.parametrize("keywords", [(), ("", )])
+def test_search_without_keywords_returns_whole_catalogue(database, keywords):
+    assert _ids(database.search(*keywords)) == ["14-10-0287-01", "10-10-0135-01"]